@@ -0,0 +1,105 @@
+"""
+Helpers for resolving names and dependencies while walking the AST of the analyzed files
+
+These are called for every (imported) name and AST node, i.e., they are on the hot path of the analysis.
+The module is fully type annotated and self-contained, so it can optionally be compiled with mypyc:
+    mypyc src/depytree/_ast_fast.py
+"""
+
+import ast
+import logging
+from typing import Any
+
+logger = logging.getLogger(" ")
+
+
+def is_private(name: str) -> bool:
+    return name.startswith("_") and name != "__main__"
+
+
+def get_parent(full_name: str, levels_up: int = 1) -> str:
+    """parent_module.child_module -> parent_module"""
+    if levels_up <= 0:
+        return full_name
+    # if there are fewer levels than levels_up, this is the root
+    return full_name.rsplit(".", levels_up)[0]
+
+
+def get_all_parents(full_name: str) -> list[str]:
+    """a.b.c.d -> [a, a.b, a.b.c]"""
+    parts = full_name.split(".")
+    return [".".join(parts[:i]) for i in range(1, len(parts))]
+
+
+def resolve_relative_import(module_base_name: str, module: str | None, level: int) -> str | None:
+    """parent_module.child, ...other_child -> parent_module.child.other_child"""
+    parts = module_base_name.split(".")
+    if level > len(parts):
+        return module  # fallback if level is too high
+    prefix = parts[:-level]
+    if module:
+        return ".".join(prefix + module.split("."))
+    return ".".join(prefix)
+
+
+def resolve_deps(ast_node: ast.AST, name_to_fullname: dict[str, str], module_base_name: str, info: dict[str, Any]) -> None:
+    """
+    Collect the dependencies of a single unit by resolving the names used in its AST
+
+    Inputs:
+        - ast_node: the AST node of the unit (class or function definition)
+        - name_to_fullname: mapping from names defined or imported in the file to their full names
+        - module_base_name: full name of the module the unit belongs to
+        - info: the unit's entry in collected; found dependencies are added to its dependencies_[same/other] sets
+    """
+    # names from the same module start with this prefix (the "." ensures e.g. "pkg.mod_b" isn't matched for "pkg.mod")
+    module_prefix = f"{module_base_name}."
+    add_same = info["dependencies_same"].add
+    add_other = info["dependencies_other"].add
+    debug = logger.isEnabledFor(logging.DEBUG)
+    # inner parts of dotted names, which were already handled together with the outermost attribute
+    inner_nodes: set[ast.expr] = set()
+    # ast.walk is breadth first, i.e., the outermost attribute is always seen before its inner parts
+    for node in ast.walk(ast_node):
+        if type(node) is ast.Name:
+            # for individual names
+            if node in inner_nodes:
+                continue
+            name = node.id
+            if name in name_to_fullname:
+                fullname = name_to_fullname[name]
+                if debug:
+                    logger.debug(f"[Name] Dependency found: {name} -> {fullname}")
+                if fullname.startswith(module_prefix) or fullname == module_base_name:
+                    add_same(fullname)
+                else:
+                    add_other(fullname)
+            elif debug:
+                logger.debug(f"[Name] Not sure what to do with: {name}")
+
+        elif type(node) is ast.Attribute:
+            # handle dotted names like module.function()
+            if node in inner_nodes:
+                continue
+            parts = []
+            part: ast.expr = node
+            while type(part) is ast.Attribute:
+                parts.append(part.attr)
+                part = part.value
+                inner_nodes.add(part)
+            if type(part) is ast.Name:
+                name = part.id
+                if name in name_to_fullname:
+                    fullname = name_to_fullname[name]
+                    parts.append(fullname)
+                    resolved_name = ".".join(reversed(parts))
+                    if debug:
+                        logger.debug(f"[Attribute] Dependency found: {name} -> {resolved_name}")
+                    if resolved_name.startswith(module_prefix) or resolved_name == module_base_name:
+                        add_same(resolved_name)
+                    else:
+                        add_other(resolved_name)
+                elif debug:
+                    parts.append(name)
+                    resolved_name = ".".join(reversed(parts))
+                    logger.debug(f"[Attribute] Not sure what to do with: {resolved_name}")
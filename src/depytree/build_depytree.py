@@ -1,58 +1,42 @@
-# ruff: noqa: B023
 import ast
 import colorsys
 import importlib
 import json
 import logging
 import os
-from collections import Counter
-from glob import glob
+import shutil
+from collections import Counter, deque
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, repeat
 
+from depytree._ast_fast import get_all_parents, get_parent, is_private, resolve_deps, resolve_relative_import  # noqa: F401
 from depytree.metrics import (
     MinMaxScaler,
     generate_git_log,
+    get_all_git_revisions,
     get_file_stats,
     get_git_dependencies,
-    get_git_revisions,
+    load_file_stats_cache,
     norm_counts,
+    parse_git_log,
+    save_file_stats_cache,
 )
 
+try:
+    # optional dependency to write the (possibly large) JSON files faster
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+# below this many files, starting the worker processes takes longer than parsing the files in a single process
+_MIN_FILES_PARALLEL = 500
+
 logging.basicConfig()
 logger = logging.getLogger(" ")
 logger.setLevel(logging.INFO)
 
 
-def is_private(name: str):
-    return name.startswith("_") and name != "__main__"
-
-
-def get_parent(full_name: str, levels_up: int = 1):
-    """parent_module.child_module -> parent_module"""
-    if levels_up <= 0:
-        return full_name
-    parts = full_name.split(".")
-    if levels_up >= len(parts):
-        return parts[0]
-    return ".".join(parts[:-levels_up])
-
-
-def get_all_parents(full_name: str):
-    """a.b.c.d -> [a, a.b, a.b.c]"""
-    parts = full_name.split(".")
-    return [".".join(parts[:i]) for i in range(1, len(parts))]
-
-
-def resolve_relative_import(module_base_name: str, module: str | None, level: int):
-    """parent_module.child, ...other_child -> parent_module.child.other_child"""
-    parts = module_base_name.split(".")
-    if level > len(parts):
-        return module  # fallback if level is too high
-    prefix = parts[:-level]
-    if module:
-        return ".".join(prefix + module.split("."))
-    return ".".join(prefix)
-
-
 def sortkey_collected(info: dict, name: str):
     """
     What is at the bottom:
@@ -93,27 +77,46 @@ def sortkey_collected(info: dict, name: str):
     )
 
 
-def add_git_dependencies(collected_modules: dict[str, dict], git_dir: str | None, log_file: str | None):
+def add_git_dependencies(
+    collected_modules: dict[str, dict],
+    git_dir: str | None,
+    log_file: str | None,
+    git_commits: tuple[list[str], list[int]] | None = None,
+):
     if log_file is not None:
         # add mapping from relative file paths to module names to match git log entries
         path_mapping = {os.path.relpath(v["path"], git_dir): k for k, v in collected_modules.items() if v["type"] == "file"}
-        git_dep = norm_counts(get_git_dependencies(log_file, path_mapping))
+        git_dep = norm_counts(get_git_dependencies(log_file, path_mapping, commits=git_commits))
         for module, info in collected_modules.items():
             if info["type"] == "file" and module in git_dep:
                 info["dependencies_git"] = git_dep[module]
     return collected_modules
 
 
-def add_metrics_per_file(collected_modules: dict[str, dict], git_dir: str | None, log_file: str | None):
+def add_metrics_per_file(
+    collected_modules: dict[str, dict],
+    git_dir: str | None,
+    log_file: str | None,
+    file_stats_cache_path: str | None = None,
+    git_revisions: dict[str, tuple[int, int]] | None = None,
+):
+    # reuse the file stats of unchanged files from previous runs
+    if file_stats_cache_path is not None:
+        load_file_stats_cache(file_stats_cache_path)
+    # parse the git log only once instead of once per file (unless it was already parsed by the caller)
+    if git_revisions is None:
+        git_revisions = get_all_git_revisions(log_file) if log_file is not None else {}
     for _module, info in collected_modules.items():
         if info["type"] == "file":
             loc, loc_nonempty, n_ind = get_file_stats(info["path"])
             # proxy for complexity: average indentation per line (more indents = nested if statements etc)
             info["complexity"] = n_ind / max(1, loc)
             if log_file is not None:
-                commit_count, line_change_sum = get_git_revisions(log_file, os.path.relpath(info["path"], git_dir))
+                commit_count, line_change_sum = git_revisions.get(os.path.relpath(info["path"], git_dir), (0, 0))
                 # volatility: number of lines changed in the last year, normalized by total number of lines now
                 info["volatility"] = line_change_sum / max(1, loc)
+    if file_stats_cache_path is not None:
+        save_file_stats_cache(file_stats_cache_path)
     return collected_modules
 
 
@@ -133,8 +136,24 @@ def collect_modules(module_name_or_path: str, file_ext: str = ".py"):
     root_module_name = root_path.split(os.sep)[-1]
     collected = {}
 
-    def walk(path: str, module_name: str):
-        entry = {
+    init_file_name = f"__init__{file_ext}"
+    # single pass to find all directories that somewhere along the line contain a python file
+    # (symlinked directories are followed as well, but each directory is only visited once to avoid link cycles)
+    walked = []
+    visited = set()
+    for dirpath, dirnames, filenames in os.walk(root_path, followlinks=True):
+        visited.add(os.path.realpath(dirpath))
+        dirnames[:] = [d for d in dirnames if os.path.realpath(os.path.join(dirpath, d)) not in visited]
+        walked.append((dirpath, dirnames, filenames))
+    # subdirectories come after their parents, i.e., in reverse order they are processed bottom-up
+    has_py: dict[str, bool] = {}
+    for dirpath, dirnames, filenames in reversed(walked):
+        has_py[dirpath] = any(f.endswith(file_ext) for f in filenames) or any(
+            has_py.get(os.path.join(dirpath, d), False) for d in dirnames
+        )
+
+    def walk(path: str, module_name: str, is_dir: bool):
+        entry: dict = {
             "path": path,
             "level": len(module_name.split(".")),
             "private": is_private(module_name.split(".")[-1]),
@@ -143,30 +162,29 @@ def collect_modules(module_name_or_path: str, file_ext: str = ".py"):
             "dependencies_other": set(),
         }
 
-        if os.path.isfile(path):
+        if not is_dir:
             # we already know that it must by a python file since we don't continue with other files below
             # children for files are units and will be added later
             entry["type"] = "file"
 
-        elif os.path.isdir(path):
+        else:
             entry["type"] = "directory"
-            children = os.listdir(path)
-            children_paths = [os.path.join(path, child) for child in children]
-
-            for child_path in children_paths:
-                # only explore directories that somewhere along the line contain a python file (i.e., not __pycache__)
-                # only move forward with python files that are not __init__.py
-                if (os.path.isdir(child_path) and len(glob(f"{child_path}{os.sep}**{os.sep}*{file_ext}", recursive=True))) or (
-                    os.path.isfile(child_path) and child_path.endswith(file_ext) and not child_path.endswith("__init__.py")
-                ):
-                    child_module_name = f"{module_name}.{os.path.splitext(os.path.basename(child_path))[0]}"
-                    entry["children"].append(child_module_name)
-                    # recursive traversal
-                    collected[child_module_name] = walk(child_path, child_module_name)
+            with os.scandir(path) as children:
+                for child in children:
+                    child_is_dir = child.is_dir()
+                    # only explore directories that somewhere along the line contain a python file (i.e., not __pycache__)
+                    # only move forward with python files that are not __init__.py
+                    if (child_is_dir and has_py.get(child.path, False)) or (
+                        child.name.endswith(file_ext) and child.name != init_file_name and child.is_file()
+                    ):
+                        child_module_name = f"{module_name}.{os.path.splitext(child.name)[0]}"
+                        entry["children"].append(child_module_name)
+                        # recursive traversal
+                        collected[child_module_name] = walk(child.path, child_module_name, child_is_dir)
 
         return entry
 
-    collected[root_module_name] = walk(root_path, root_module_name)
+    collected[root_module_name] = walk(root_path, root_module_name, True)
     return root_module_name, collected
 
 
@@ -175,9 +193,11 @@ def collect_units(
     module_base_name: str,
     known_submodules: set,
     include_globals: bool = False,
+    parent_of: dict[str, str] | None = None,
 ):
     """
-    Read in a single file and return a dict with all functions, classes, and possibly global variables:
+    Read in a single file and return a dict with all functions, classes, and possibly global variables
+    (parent_of can map the known_submodules to their parent modules, so this isn't recomputed for every file):
     {
         "unit_name": {
             "type": ("class" / "function" / "global"),
@@ -191,9 +211,13 @@ def collect_units(
 
     logger.info(f"## Analyzing file: {file_path}")
     root_module_name = module_base_name.split(".")[0]
+    # names from the same package start with this prefix (the "." ensures e.g. "pkg_b" isn't matched for "pkg")
+    root_prefix = f"{root_module_name}."
     module_parent_name = get_parent(module_base_name)
+    if parent_of is None:
+        parent_of = {module_name: get_parent(module_name) for module_name in known_submodules}
 
-    collected = {}
+    collected: dict[str, dict] = {}
     name_to_fullname = {}
     module_dependencies_same = set()
     module_dependencies_other = set()
@@ -250,8 +274,8 @@ def collect_units(
 
         elif isinstance(node, ast.Import):
             for alias in node.names:
-                if alias.name.startswith(root_module_name) and alias.name in known_submodules:
-                    if get_parent(alias.name) == module_parent_name:
+                if alias.name in known_submodules:
+                    if parent_of[alias.name] == module_parent_name:
                         module_dependencies_same.add(alias.name)
                     else:
                         module_dependencies_other.add(alias.name)
@@ -264,11 +288,11 @@ def collect_units(
 
             for alias in node.names:
                 fullname = f"{base_module}.{alias.name}" if base_module else alias.name
-                if fullname.startswith(root_module_name):
+                if fullname.startswith(root_prefix) or fullname == root_module_name:
                     # check whether we imported a module or individual unit since modules should only have module dependencies
                     from_module_name = fullname if fullname in known_submodules else get_parent(fullname)
                     if from_module_name in known_submodules:
-                        if get_parent(from_module_name) == module_parent_name:
+                        if parent_of[from_module_name] == module_parent_name:
                             module_dependencies_same.add(from_module_name)
                         else:
                             module_dependencies_other.add(from_module_name)
@@ -280,64 +304,43 @@ def collect_units(
         ast_node = info.pop("ast_node")
 
         logger.info(f"# Processing: {fullname}")
-
-        class DependencyVisitor(ast.NodeVisitor):
-            def visit_Name(self, node):
-                # for individual names
-                name = node.id
-                if name in name_to_fullname:
-                    fullname = name_to_fullname[name]
-                    logger.debug(f"[visit_Name] Dependency found: {name} -> {fullname}")
-                    if fullname.startswith(module_base_name):
-                        info["dependencies_same"].add(fullname)
-                    else:
-                        info["dependencies_other"].add(fullname)
-                else:
-                    logger.debug(f"[visit_Name] Not sure what to do with: {name}")
-                self.generic_visit(node)
-
-            def visit_Attribute(self, node):
-                # handle dotted names like module.function()
-                parts = []
-                while isinstance(node, ast.Attribute):
-                    parts.append(node.attr)
-                    node = node.value
-                if isinstance(node, ast.Name):
-                    name = node.id
-                    if name in name_to_fullname:
-                        fullname = name_to_fullname[name]
-                        parts.append(fullname)
-                        resolved_name = ".".join(reversed(parts))
-                        logger.debug(f"[visit_Attribute] Dependency found: {name} -> {resolved_name}")
-                        if resolved_name.startswith(module_base_name):
-                            info["dependencies_same"].add(resolved_name)
-                        else:
-                            info["dependencies_other"].add(resolved_name)
-                    else:
-                        parts.append(name)
-                        resolved_name = ".".join(reversed(parts))
-                        logger.debug(f"[visit_Attribute] Not sure what to do with: {resolved_name}")
-                self.generic_visit(node)
-
-        DependencyVisitor().visit(ast_node)
+        resolve_deps(ast_node, name_to_fullname, module_base_name, info)
 
     return collected, module_dependencies_same, module_dependencies_other
 
 
-def collect_modules_and_units(root_module_name_or_path: str):
+def collect_modules_and_units(root_module_name_or_path: str, max_workers: int | None = None):
     root_module_name, collected_modules = collect_modules(root_module_name_or_path)
 
     # identify units for all files and add module dependencies
+    known_submodules = set(collected_modules)
+    parent_of = {module_name: get_parent(module_name) for module_name in collected_modules}
+    file_modules = [module_name for module_name, info in collected_modules.items() if info["type"] == "file"]
+    file_args = (
+        [collected_modules[module_name]["path"] for module_name in file_modules],
+        file_modules,
+        repeat(known_submodules),
+        repeat(False),
+        repeat(parent_of),
+    )
+    if max_workers is None:
+        # only use several processes for large packages (unless the number of workers is set explicitly)
+        max_workers = 1 if len(file_modules) < _MIN_FILES_PARALLEL else os.cpu_count() or 1
+    if max_workers == 1 or len(file_modules) <= 1:
+        results = list(map(collect_units, *file_args))
+    else:
+        # the files can be parsed independently, so we distribute them over several processes
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            chunksize = max(1, len(file_modules) // (4 * max_workers))
+            results = list(executor.map(collect_units, *file_args, chunksize=chunksize))
+
     collected_units: dict[str, dict] = {}
-    for module_name, info in collected_modules.items():
-        if info["type"] == "file":
-            new_collected_units, module_dep_same, module_dep_other = collect_units(
-                info["path"], module_name, set(collected_modules.keys())
-            )
-            info["children"] = sorted(new_collected_units.keys())
-            info["dependencies_same"] = module_dep_same
-            info["dependencies_other"] = module_dep_other
-            collected_units |= new_collected_units
+    for module_name, (new_collected_units, module_dep_same, module_dep_other) in zip(file_modules, results, strict=True):
+        info = collected_modules[module_name]
+        info["children"] = sorted(new_collected_units.keys())
+        info["dependencies_same"] = module_dep_same
+        info["dependencies_other"] = module_dep_other
+        collected_units |= new_collected_units
 
     # fix dependencies that went too deep
     for unit_name in collected_units:
@@ -345,9 +348,10 @@ def collect_modules_and_units(root_module_name_or_path: str):
             new_set = []
             for dep in collected_units[unit_name][dep_set]:
                 if dep not in collected_units:
-                    if get_parent(dep) in collected_units:
-                        logger.info(f"Mapping {dep} to {get_parent(dep)}")
-                        dep = get_parent(dep)  # noqa: PLW2901
+                    dep_parent = get_parent(dep)
+                    if dep_parent in collected_units:
+                        logger.info(f"Mapping {dep} to {dep_parent}")
+                        dep = dep_parent  # noqa: PLW2901
                     else:
                         logger.warning(f"Unknown dependency for {unit_name}: {dep}")
                         continue
@@ -359,24 +363,28 @@ def collect_modules_and_units(root_module_name_or_path: str):
 
 
 def add_n_incoming_deps(collected_modules: dict, collected_units: dict):
-    # add incoming dependencies for sorting
-    all_dependencies_same = []
-    all_dependencies_other = []
-    for _, info in (collected_units | collected_modules).items():
-        if info["type"] == "directory":
+    # add incoming dependencies for sorting (iterating over both dicts without merging them into a new one)
+    all_dependency_counts_same: Counter = Counter()
+    all_dependency_counts_other: Counter = Counter()
+    for _, info in chain(collected_units.items(), collected_modules.items()):
+        info_type = info["type"]
+        if info_type == "directory":
             continue
-        all_dependencies_same.extend(info["dependencies_same"])
-        all_dependencies_other.extend(info["dependencies_other"])
-        # additionally add all the parents
-        if info["type"] == "file":
-            for dep in info["dependencies_same"]:
-                all_dependencies_same.extend(get_all_parents(dep))
-            for dep in info["dependencies_other"]:
-                all_dependencies_other.extend(get_all_parents(dep))
-
-    all_dependency_counts_same = Counter(all_dependencies_same)
-    all_dependency_counts_other = Counter(all_dependencies_other)
-    for name, info in (collected_units | collected_modules).items():
+        all_dependency_counts_same.update(info["dependencies_same"])
+        all_dependency_counts_other.update(info["dependencies_other"])
+        # additionally add all the parents (a.b.c -> a.b, a), directly counted without creating lists of parents
+        if info_type == "file":
+            for dependency_counts, deps in (
+                (all_dependency_counts_same, info["dependencies_same"]),
+                (all_dependency_counts_other, info["dependencies_other"]),
+            ):
+                for dep in deps:
+                    end = dep.rfind(".")
+                    while end > 0:
+                        dependency_counts[dep[:end]] += 1
+                        end = dep.rfind(".", 0, end)
+
+    for name, info in chain(collected_units.items(), collected_modules.items()):
         if info["type"] == "directory":
             continue
         info["n_incoming_dependencies_same"] = all_dependency_counts_same.get(name, 0)
@@ -386,69 +394,62 @@ def add_n_incoming_deps(collected_modules: dict, collected_units: dict):
 
 
 def propagate_directory_deps(collected_modules: dict):
+    # the level is the only field needed for the (many) dependencies, so we keep it in a flat dict
+    level_of = {module: info["level"] for module, info in collected_modules.items()}
     # propagate dependencies up from files to directories by starting with the lowest levels
     for module, info in sorted(collected_modules.items(), key=lambda x: x[1]["level"], reverse=True):
         if info["type"] == "file":
             continue
         module_parent_name = get_parent(module)
+        level = info["level"]
+        dependencies_same = info["dependencies_same"]
+        dependencies_other = info["dependencies_other"]
+        n_incoming_same = 0
+        n_incoming_other = 0
         for child in info["children"]:
-            for dep in collected_modules[child]["dependencies_same"] | collected_modules[child]["dependencies_other"]:
-                if dep.startswith(module) or (
-                    dep.startswith(module_parent_name) and collected_modules[dep]["level"] == info["level"]
-                ):
-                    info["dependencies_same"].add(dep)
+            child_info = collected_modules[child]
+            # chain instead of a union to avoid creating a new set per child (duplicates are handled by the sets below)
+            for dep in chain(child_info["dependencies_same"], child_info["dependencies_other"]):
+                if dep.startswith(module) or (dep.startswith(module_parent_name) and level_of[dep] == level):
+                    dependencies_same.add(dep)
                 else:
-                    info["dependencies_other"].add(dep)
+                    dependencies_other.add(dep)
+            n_incoming_same += child_info["n_incoming_dependencies_same"]
+            n_incoming_other += child_info["n_incoming_dependencies_other"]
         # we take the avg here since many submodules with individually few incoming dependencies (especially local ones)
         # shouldn't count as much as some files that many modules depend on
-        info["n_incoming_dependencies_same"] = sum(
-            [collected_modules[child]["n_incoming_dependencies_same"] for child in info["children"]]
-        ) / max(1, len(info["children"]))
-        info["n_incoming_dependencies_other"] = sum(
-            [collected_modules[child]["n_incoming_dependencies_other"] for child in info["children"]]
-        ) / max(1, len(info["children"]))
+        info["n_incoming_dependencies_same"] = n_incoming_same / max(1, len(info["children"]))
+        info["n_incoming_dependencies_other"] = n_incoming_other / max(1, len(info["children"]))
     return collected_modules
 
 
 def get_sorted_names(root_module_name: str, collected_modules: dict, collected_units: dict):
-    # sort modules recursively
+    # compute the sort keys only once per module / unit so sorting only needs a single dict lookup per name
+    sort_keys = {k: sortkey_collected(v, k) for k, v in chain(collected_modules.items(), collected_units.items())}
+
+    # sort modules recursively (depth first, i.e., the sorted children of a directory replace it at the front)
     sorted_modules = []
-    all_children = sorted(
-        collected_modules[root_module_name]["children"],
-        key=lambda k: sortkey_collected(collected_modules[k], k),
-    )
+    all_children = deque(sorted(collected_modules[root_module_name]["children"], key=sort_keys.__getitem__))
     while all_children:
-        next_child = all_children.pop(0)
+        next_child = all_children.popleft()
         if collected_modules[next_child]["type"] == "file":
             sorted_modules.append(next_child)
         else:
-            all_children = (
-                sorted(
-                    collected_modules[next_child]["children"],
-                    key=lambda k: sortkey_collected(collected_modules[k], k),
-                )
-                + all_children
-            )
+            # extendleft inserts the items one by one, i.e., they need to be given in reverse order
+            all_children.extendleft(sorted(collected_modules[next_child]["children"], key=sort_keys.__getitem__, reverse=True))
 
     # get all names, i.e., modules and then within them the units, sorted
     sorted_names = []
     for module in sorted_modules:
         sorted_names.append(module)
-        sorted_names.extend(
-            sorted(
-                collected_modules[module]["children"],
-                key=lambda k: sortkey_collected(collected_units[k], k),
-            )
-        )
+        sorted_names.extend(sorted(collected_modules[module]["children"], key=sort_keys.__getitem__))
     return sorted_names
 
 
-def prepare_json(sorted_names: list[str], collected: dict):
+def iter_nodes(sorted_names: list[str], collected: dict) -> Iterator[dict]:
     size_scaler = MinMaxScaler(collected, "complexity")
     color_scaler = MinMaxScaler(collected, "volatility")
     units_color_map = {True: "#ccabb2", False: "#bbccab"}
-    nodes = []
-    links = []
     for name in sorted_names:
         if collected[name]["type"] == "directory":
             continue
@@ -466,30 +467,63 @@ def prepare_json(sorted_names: list[str], collected: dict):
             label = name.split(".")[-1]
             size = 0
             color = units_color_map[collected[name]["private"]]
-        nodes.append(
-            {
-                "id": name,
-                "label": label,
-                "type": collected[name]["type"],
-                "size": size,
-                "color": color,
-            }
-        )
+        yield {
+            "id": name,
+            "label": label,
+            "type": collected[name]["type"],
+            "size": size,
+            "color": color,
+        }
 
-        for dep in collected[name].get("dependencies_same", set()) | collected[name].get("dependencies_other", set()):
+
+def iter_links(sorted_names: list[str], collected: dict) -> Iterator[dict]:
+    included_names = set(sorted_names)
+    for name in sorted_names:
+        if collected[name]["type"] == "directory":
+            continue
+        for dep in chain(collected[name].get("dependencies_same", ()), collected[name].get("dependencies_other", ())):
             if dep not in collected:
                 logger.warning(f"Unknown dependency for {name}: {dep}")
                 continue
-            if dep in sorted_names:
-                links.append({"source": name, "target": dep, "type": "import", "strength": 1.0})
+            if dep in included_names:
+                yield {"source": name, "target": dep, "type": "import", "strength": 1.0}
 
         for dep in collected[name].get("dependencies_git", []):
-            if dep in sorted_names:
-                links.append(
-                    {"source": name, "target": dep, "type": "git", "strength": collected[name]["dependencies_git"][dep]}
-                )
+            if dep in included_names:
+                yield {"source": name, "target": dep, "type": "git", "strength": collected[name]["dependencies_git"][dep]}
+
+
+def prepare_json(sorted_names: list[str], collected: dict):
+    return {"nodes": list(iter_nodes(sorted_names, collected)), "links": list(iter_links(sorted_names, collected))}
+
+
+def _dumps(item: dict) -> str:
+    if orjson is not None:
+        return orjson.dumps(item, option=orjson.OPT_INDENT_2).decode()
+    # like orjson, write non-ASCII characters as they are (the file is UTF-8 encoded)
+    return json.dumps(item, indent=2, ensure_ascii=False)
 
-    return {"nodes": nodes, "links": links}
+
+def save_json(sorted_names: list[str], collected: dict, save_path: str):
+    """
+    Write the graph data (like returned by prepare_json) to a JSON file
+
+    Instead of first creating the complete lists of nodes and links, the items are written one at a time,
+    formatted like json.dump(..., indent=2) would do it.
+    """
+    with open(save_path, "w", encoding="utf-8") as f:
+        f.write("{\n")
+        for key, items in (("nodes", iter_nodes(sorted_names, collected)), ("links", iter_links(sorted_names, collected))):
+            f.write(f'  "{key}": [')
+            is_empty = True
+            for item in items:
+                f.write("\n    " if is_empty else ",\n    ")
+                # strings in JSON can't contain line breaks, i.e., all of them come from the indentation
+                f.write(_dumps(item).replace("\n", "\n    "))
+                is_empty = False
+            f.write("]" if is_empty else "\n  ]")
+            f.write(",\n" if key == "nodes" else "\n")
+        f.write("}")
 
 
 def main(root_module_name_or_path: str):
@@ -499,8 +533,16 @@ def main(root_module_name_or_path: str):
     # try to generate the git log using one of the files' path
     a_path = [v["path"] for v in collected_modules.values() if v["type"] == "file"][0]  # noqa: RUF015
     git_dir, log_file = generate_git_log(a_path)
-    collected_modules = add_metrics_per_file(collected_modules, git_dir, log_file)
-    collected_modules = add_git_dependencies(collected_modules, git_dir, log_file)
+    # parse the git log only once for both the revision stats and the git dependencies
+    git_revisions, git_commits = parse_git_log(log_file) if log_file is not None else ({}, None)
+    collected_modules = add_metrics_per_file(
+        collected_modules,
+        git_dir,
+        log_file,
+        file_stats_cache_path=os.path.join("data", "file_stats_cache.json"),
+        git_revisions=git_revisions,
+    )
+    collected_modules = add_git_dependencies(collected_modules, git_dir, log_file, git_commits)
     collected_modules, collected_units = add_n_incoming_deps(collected_modules, collected_units)
     collected_modules = propagate_directory_deps(collected_modules)
     sorted_names = get_sorted_names(root_module_name, collected_modules, collected_units)
@@ -509,16 +551,12 @@ def main(root_module_name_or_path: str):
     os.makedirs("data", exist_ok=True)
     save_path = "data/graph_data.json"
     logger.info(f"## Creating JSON file {save_path}")
-    json_data = prepare_json(sorted_names, collected)
-    with open(save_path, "w") as f:
-        json.dump(json_data, f, indent=2)
+    save_json(sorted_names, collected, save_path)
 
     save_path = "data/graph_data_modules.json"
     logger.info(f"## Creating JSON file {save_path}")
     sorted_names_modules_only = [n for n in sorted_names if collected[n]["type"] == "file"]
-    json_data = prepare_json(sorted_names_modules_only, collected)
-    with open(save_path, "w") as f:
-        json.dump(json_data, f, indent=2)
+    save_json(sorted_names_modules_only, collected, save_path)
 
     return sorted_names, collected
 
@@ -526,8 +564,10 @@ def main(root_module_name_or_path: str):
 def main_git_only(root_module_path: str):
     logger.info(f"### Analyzing {root_module_path}")
     git_dir, log_file = generate_git_log(root_module_path)
+    # parse the git log only once for both the git dependencies and the revision stats
+    git_revisions, git_commits = parse_git_log(log_file)  # type: ignore
     collected_modules = {}
-    git_dep = norm_counts(get_git_dependencies(log_file))  # type: ignore
+    git_dep = norm_counts(get_git_dependencies(log_file, commits=git_commits))  # type: ignore
     for module in git_dep:
         full_path = os.path.join(git_dir, module)  # type: ignore
         # check that we're not trying to access renamed files
@@ -537,16 +577,19 @@ def main_git_only(root_module_path: str):
                 "path": full_path,
                 "dependencies_git": git_dep[module],
             }
-    collected_modules = add_metrics_per_file(collected_modules, git_dir, log_file)
+    collected_modules = add_metrics_per_file(
+        collected_modules,
+        git_dir,
+        log_file,
+        file_stats_cache_path=os.path.join("data", "file_stats_cache.json"),
+        git_revisions=git_revisions,
+    )
     sorted_names = sorted([k for k, v in collected_modules.items() if v["type"] == "file"])
 
     # same json for modules and all with only the files
     logger.info("## Creating JSON files")
-    json_data = prepare_json(sorted_names, collected_modules)
     os.makedirs("data", exist_ok=True)
-    with open("data/graph_data.json", "w") as f:
-        json.dump(json_data, f, indent=2)
-    with open("data/graph_data_modules.json", "w") as f:
-        json.dump(json_data, f, indent=2)
+    save_json(sorted_names, collected_modules, "data/graph_data.json")
+    shutil.copyfile("data/graph_data.json", "data/graph_data_modules.json")
 
     return sorted_names, collected_modules
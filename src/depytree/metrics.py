@@ -1,8 +1,23 @@
 """Code metrics inspired by the book "Your Code as a Crime Scene (2nd Edition)" by Adam Thornhill"""
 
+import glob
+import hashlib
+import heapq
+import json
 import os
+import shutil
 import subprocess
-from collections import defaultdict
+import tempfile
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from itertools import pairwise
+
+# marks the start of a new commit in the git log (see the --pretty format in generate_git_log)
+_COMMIT_PREFIX = "--COMMIT--"
+# results of get_file_stats in this run: {abs_path: [mtime_ns, size, space_per_tab, loc, loc_nonempty, n_indents]}
+_file_stats_cache: dict[str, list[int]] = {}
+# results of previous runs (see load_file_stats_cache), only saved again if the file is analyzed in this run
+_loaded_file_stats: dict[str, list[int]] = {}
 
 
 class MinMaxScaler:
@@ -14,15 +29,17 @@ class MinMaxScaler:
             - collection: dict, e.g., collected_modules with "complexity" in subdicts
             - key: which item in the dict should be used when extracting values (e.g., "complexity")
         """
-        values = sorted([d[key] for d in collection.values() if key in d])
-        # do some rough outlier filtering
+        values = [d[key] for d in collection.values() if key in d]
+        # do some rough outlier filtering (second smallest & largest values, picked without sorting everything)
         if len(values) > 2:
-            self._min = min(values[1:])
-            self._max = max(values[:-1])
+            self._min = heapq.nsmallest(2, values)[1]
+            self._max = heapq.nlargest(2, values)[1]
         else:
             values.append(0)  # in case the list is empty
             self._min = min(values)
             self._max = max(values)
+        # computed once here instead of on every call to scale
+        self._range = self._max - self._min
 
     def scale(self, value) -> float:
         """
@@ -33,14 +50,15 @@ class MinMaxScaler:
         Returns:
             - the given number scaled as (value - min) / (max - min)
         """
-        if (self._max - self._min) == 0:
+        if self._range == 0:
             return 0
-        return min(1, max(0, (value - self._min) / (self._max - self._min)))
+        return min(1, max(0, (value - self._min) / self._range))
 
 
 def get_file_stats(filepath: str, space_per_tab: int = 4) -> tuple[int, int, int]:
     """
     Extract file statistics related to code complexity
+    (the results are cached as long as the file's modification time and size stay the same)
 
     Inputs:
         - filepath: the path to the file that should be analyzed
@@ -51,29 +69,72 @@ def get_file_stats(filepath: str, space_per_tab: int = 4) -> tuple[int, int, int
         - loc without empty lines (but with comments)
         - total indentations (i.e., leading whitespace, both spaces and tabs)
     """
-    loc = 0
-    loc_nonempty = 0
-    n_indents = 0
-    try:
-        with open(filepath, encoding="utf-8") as f:
-            for line in f:
-                loc += 1
-                if line.strip():
-                    loc_nonempty += 1
-                leading = len(line) - len(line.lstrip())
-                for ch in line[:leading]:
-                    if ch == "\t":
-                        n_indents += space_per_tab
-                    elif ch == " ":
-                        n_indents += 1
-    except UnicodeDecodeError as e:
-        print(f"Problem with file {filepath}: {e}")
+    # the stats only need to be recomputed if the file was changed since it was last analyzed
+    abs_path = os.path.abspath(filepath)
+    st = os.stat(abs_path)
+    key = [st.st_mtime_ns, st.st_size, space_per_tab]
+    cached = _file_stats_cache.get(abs_path) or _loaded_file_stats.get(abs_path)
+    if cached is not None and cached[:3] == key:
+        _file_stats_cache[abs_path] = cached
+        return cached[3], cached[4], cached[5]
+
+    # work directly on the bytes, since we're only counting whitespace and newlines
+    with open(abs_path, "rb") as f:
+        data = f.read()
+    loc = data.count(b"\n") + (1 if data and not data.endswith(b"\n") else 0)
+    lines = data.split(b"\n")
+    # the length of each line without its leading whitespace, computed in C without a Python-level loop over the lines
+    stripped_lengths = list(map(len, map(bytes.lstrip, lines)))
+    loc_nonempty = len(lines) - stripped_lengths.count(0)
+    if not any(c in data for c in (b"\t", b"\r", b"\x0b", b"\x0c")):
+        # spaces are the only whitespace besides newlines, i.e., each leading whitespace character is one indentation
+        n_indents = len(data) - (len(lines) - 1) - sum(stripped_lengths)
+    else:
+        # count spaces and tabs in all leading whitespace at once
+        indents = b"".join([line[: len(line) - n] for line, n in zip(lines, stripped_lengths, strict=True)])
+        n_indents = indents.count(b" ") + space_per_tab * indents.count(b"\t")
+    _file_stats_cache[abs_path] = [*key, loc, loc_nonempty, n_indents]
     return loc, loc_nonempty, n_indents
 
 
+def load_file_stats_cache(cache_path: str):
+    """
+    Load the results of previous get_file_stats calls (as saved by save_file_stats_cache)
+
+    Inputs:
+        - cache_path: path to the JSON file with the cached file stats (ignored if it doesn't exist or is invalid)
+    """
+    try:
+        with open(cache_path) as f:
+            file_stats = json.load(f)
+    except (OSError, ValueError):
+        return
+    # the file could have been written by something else, so we make sure it has the format of _file_stats_cache
+    if not isinstance(file_stats, dict):
+        return
+    for stats in file_stats.values():
+        if not (isinstance(stats, list) and len(stats) == 6 and all(type(x) is int for x in stats)):
+            return
+    _loaded_file_stats.update(file_stats)
+
+
+def save_file_stats_cache(cache_path: str):
+    """
+    Save the results of all get_file_stats calls so far to be reused in the next run (see load_file_stats_cache)
+    (only files analyzed in this run are included, so deleted or renamed files are dropped from the cache)
+
+    Inputs:
+        - cache_path: path to the JSON file where the cached file stats should be stored
+    """
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    with open(cache_path, "w") as f:
+        json.dump(_file_stats_cache, f)
+
+
 def generate_git_log(path: str) -> tuple[str | None, str | None]:
     """
     Generate the git log for a given path considering only the last year
+    (the log is cached in data/git_log.{repo}.{key}.txt and only regenerated when the repo's HEAD or the date changes)
 
     Inputs:
         - path: path to a file or directory under git version control
@@ -83,51 +144,83 @@ def generate_git_log(path: str) -> tuple[str | None, str | None]:
         - file path for the created git log file (data/git_log.txt)
     -> if this is not a git repository, returns (None, None) instead
     """
-    # the git command needs to be called from inside the corresponding git directory
-    original_dir = os.getcwd()
+    # the git commands need to be run from inside the corresponding git directory (passed as their cwd)
     if not os.path.isdir(path):
         path = os.path.dirname(path)
     target_dir = os.path.abspath(path)
-    log_file = os.path.join(original_dir, "data", "git_log.txt")
-
-    try:
-        os.chdir(target_dir)
-        # check whether this is a git repo and get the path relative to which the file paths will be listed in the log
-        cmd = ["git", "rev-parse", "--show-toplevel"]
-        result = subprocess.run(cmd, capture_output=True, check=False, text=True)
-        if result.returncode != 0:
-            # fatal: not a git repository
-            print(result.stderr)
-            return None, None
-        git_dir = result.stdout.strip()
-
-        since = "1 year ago"  # could be function argument, but then we have the potential risk of arbitrary command execution
-        cmd = [
-            "git",
-            "log",
-            "--numstat",
-            "--date=short",
-            "--pretty=format:--COMMIT--%ad--%aN",
-            "--no-renames",
-            f"--since={since}",
-        ]
-        result = subprocess.run(cmd, capture_output=True, check=False, text=True)
-        if result.returncode != 0:
-            # should never happen....
-            print(result.stderr)
-            return None, None
-
-        with open(log_file, "w") as f:
-            f.write(result.stdout)
-
-        return git_dir, log_file
-    finally:
-        os.chdir(original_dir)
+    data_dir = os.path.abspath("data")
+    log_file = os.path.join(data_dir, "git_log.txt")
+
+    # check whether this is a git repo and get the path relative to which the file paths will be listed in the log
+    cmd = ["git", "rev-parse", "--show-toplevel"]
+    result = subprocess.run(cmd, capture_output=True, check=False, text=True, cwd=target_dir)
+    if result.returncode != 0:
+        # fatal: not a git repository
+        print(result.stderr)
+        return None, None
+    git_dir = result.stdout.strip()
+
+    # could be function argument, but then we have the potential risk of arbitrary command execution
+    # (resolved to an absolute date so a cached log never covers a different time window than a new one would)
+    since = (datetime.now(tz=timezone.utc).date() - timedelta(days=365)).isoformat()
+
+    # only added, modified, or deleted files of regular (non-merge) commits are relevant for the analysis
+    log_cmd = [
+        "git",
+        "log",
+        "--numstat",
+        "--date=short",
+        f"--pretty=format:{_COMMIT_PREFIX}%ad--%aN",
+        "--no-renames",
+        "--no-merges",
+        "--diff-filter=AMD",
+        f"--since={since}",
+    ]
+
+    # the log only changes with new commits, so a previously generated log can be reused as long as HEAD is the same
+    cmd = ["git", "rev-parse", "HEAD"]
+    result = subprocess.run(cmd, capture_output=True, check=False, text=True, cwd=target_dir)
+    if result.returncode != 0:
+        # fatal: no commits yet
+        print(result.stderr)
+        return None, None
+    # the git log options (incl. the date) are part of the key so logs generated with different options are never mixed up
+    cache_key = hashlib.sha1(
+        f"{git_dir}|{result.stdout.strip()}|{' '.join(log_cmd)}".encode(), usedforsecurity=False
+    ).hexdigest()
+    # the file name starts with a key for the repo itself, so only the outdated logs of the same repo are removed below
+    repo_key = hashlib.sha1(git_dir.encode(), usedforsecurity=False).hexdigest()[:12]
+    cached_log_file = os.path.join(data_dir, f"git_log.{repo_key}.{cache_key}.txt")
+
+    if not (os.path.isfile(cached_log_file) and os.path.getsize(cached_log_file)):
+        os.makedirs(data_dir, exist_ok=True)
+        # git writes the log straight into a file instead of it being buffered in memory first;
+        # it's only moved to its final name once git succeeded, so an interrupted run never leaves a partial log behind
+        fd, tmp_log_file = tempfile.mkstemp(prefix="git_log.", suffix=".tmp", dir=data_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                result = subprocess.run(log_cmd, stdout=f, stderr=subprocess.PIPE, check=False, text=True, cwd=target_dir)
+            if result.returncode != 0:
+                # should never happen....
+                print(result.stderr)
+                return None, None
+            os.replace(tmp_log_file, cached_log_file)
+        finally:
+            if os.path.exists(tmp_log_file):
+                os.remove(tmp_log_file)
+        # logs of earlier commits or days of this repo won't be used again
+        for old_log_file in glob.glob(os.path.join(data_dir, f"git_log.{repo_key}.*.txt")):
+            if old_log_file != cached_log_file:
+                os.remove(old_log_file)
+
+    shutil.copyfile(cached_log_file, log_file)
+    return git_dir, log_file
 
 
 def get_git_revisions(git_log_path: str, filename: str) -> tuple[int, int]:
     """
     Compute git revision stats for a single file
+    (this parses the whole git log; to get the stats for several files, use get_all_git_revisions instead)
 
     Inputs:
         - git_log_path: path to a text file with the git log as created by generate_git_log
@@ -138,68 +231,118 @@ def get_git_revisions(git_log_path: str, filename: str) -> tuple[int, int]:
         - the number of commits associated with the corresponding file
         - the number of lines that were changed over all commits (additions and removals)
     """
-    with open(git_log_path) as f:
-        git_log = f.readlines()
-
-    commit_count = 0
-    line_change_sum = 0
-
-    for next_line in git_log:
-        line = next_line.strip()
-        if not line or line.startswith("--COMMIT"):
-            continue
-        parts = line.split()
-        if len(parts) == 3 and parts[2] == filename:
-            commit_count += 1
-            added = int(parts[0]) if parts[0].isdigit() else 0
-            removed = int(parts[1]) if parts[1].isdigit() else 0
-            line_change_sum += added + removed
-
-    return commit_count, line_change_sum
+    return get_all_git_revisions(git_log_path).get(filename, (0, 0))
 
 
-def _extract_commits(git_log_path: str, file_map: dict[str, str] | None = None) -> list[list[str]]:
+def parse_git_log(git_log_path: str) -> tuple[dict[str, tuple[int, int]], tuple[list[str], list[int]]]:
     """
-    Process the git log to extract the files for each commit
+    Parse the git log in a single pass to get both the revision stats per file and the files changed in each commit
 
     Inputs:
         - git_log_path: path to a text file with the git log as created by generate_git_log
-        - file_map (optional): in case the file names should be mapped to other names (like module names)
-            if given, only files listed in this dict are included in the results
 
     Returns:
-        - list with one entry per commit, which itself is a list of all the (possibly mapped) filenames
-            which were changed in this commit
+        - dict with {filename: (commit_count, line_change_sum)} (see get_git_revisions)
+        - commits as (files, offsets) (see _extract_commits)
     """
-    with open(git_log_path) as f:
-        git_log = f.readlines()
+    # [commit_count, line_change_sum] per file
+    revisions: defaultdict[str, list[int]] = defaultdict(lambda: [0, 0])
+    # one flat list for all commits instead of a separate list per commit
+    files: list[str] = []
+    offsets = [0]
+
+    # each filename is only decoded once (which also means all its occurrences share the same str object)
+    decoded: dict[bytes, str] = {}
+    commit_prefix = _COMMIT_PREFIX.encode()
+
+    # iterate over the file directly instead of reading all lines into memory first;
+    # the lines are processed as bytes so only the filenames need to be decoded
+    with open(git_log_path, "rb") as f:
+        for line in f:
+            # numstat lines start with a digit (or "-" for binary files); skip all others before splitting
+            first = line[:1]
+            if first == b"-" and line.startswith(commit_prefix):
+                # close the previous commit if it had any files
+                if len(files) > offsets[-1]:
+                    offsets.append(len(files))
+            elif first.isdigit() or first == b"-":
+                # at most 3 parts so filenames with spaces stay intact
+                parts = line.split(None, 2)
+                if len(parts) == 3:
+                    added, removed, raw_filename = parts
+                    filename = decoded.get(raw_filename)
+                    if filename is None:
+                        filename = decoded[raw_filename] = raw_filename.rstrip().decode()
+                    stats = revisions[filename]
+                    stats[0] += 1
+                    stats[1] += (int(added) if added.isdigit() else 0) + (int(removed) if removed.isdigit() else 0)
+                    files.append(filename)
+
+    # close the last commit if any
+    if len(files) > offsets[-1]:
+        offsets.append(len(files))
+    revision_stats = {
+        filename: (commit_count, line_change_sum) for filename, (commit_count, line_change_sum) in revisions.items()
+    }
+    return revision_stats, (files, offsets)
+
+
+def get_all_git_revisions(git_log_path: str) -> dict[str, tuple[int, int]]:
+    """
+    Compute git revision stats for all files in the git log in a single pass
+    (if the files of each commit are needed as well, use parse_git_log instead)
 
-    commits = []
-    current_files: list[str] = []
+    Inputs:
+        - git_log_path: path to a text file with the git log as created by generate_git_log
 
-    for next_line in git_log:
-        line = next_line.strip()
-        if line.startswith("--COMMIT--"):
-            if current_files:
-                commits.append(current_files)
-                current_files = []
-        elif line:
-            parts = line.split()
-            if len(parts) == 3:
-                _, _, filename = parts
-                if file_map is None:
-                    current_files.append(filename)
-                elif filename in file_map:
-                    current_files.append(file_map[filename])
+    Returns:
+        - dict with {filename: (commit_count, line_change_sum)} (see get_git_revisions)
+    """
+    return parse_git_log(git_log_path)[0]
 
-    # append last commit if any
-    if current_files:
-        commits.append(current_files)
 
-    return commits
+def _extract_commits(
+    git_log_path: str, file_map: dict[str, str] | None = None, commits: tuple[list[str], list[int]] | None = None
+) -> tuple[list[str], list[int]]:
+    """
+    Process the git log to extract the files for each commit
 
+    Inputs:
+        - git_log_path: path to a text file with the git log as created by generate_git_log
+        - file_map (optional): in case the file names should be mapped to other names (like module names)
+            if given, only files listed in this dict are included in the results
+        - commits (optional): the commits as returned by parse_git_log, in case the git log was already parsed
 
-def get_git_dependencies(git_log_path: str, file_map: dict[str, str] | None = None) -> dict[str, dict[str, int]]:
+    Returns:
+        - flat list with the (possibly mapped) filenames which were changed in the commits, one commit after the other
+        - offsets of the commits in this list, i.e., the files of the i-th commit are files[offsets[i]:offsets[i+1]]
+            (commits without any (mapped) files are skipped)
+    """
+    if commits is None:
+        commits = parse_git_log(git_log_path)[1]
+    if file_map is None:
+        return commits
+
+    all_files, all_offsets = commits
+    # look up all files at once (None if the file isn't in the file_map)
+    all_mapped = list(map(file_map.get, all_files))
+    files: list[str] = []
+    offsets = [0]
+    extend, append = files.extend, offsets.append
+    for start, end in pairwise(all_offsets):
+        extend([f for f in all_mapped[start:end] if f is not None])
+        # skip commits without any mapped files
+        if len(files) > offsets[-1]:
+            append(len(files))
+    return files, offsets
+
+
+def get_git_dependencies(
+    git_log_path: str,
+    file_map: dict[str, str] | None = None,
+    max_files_per_commit: int = 500,
+    commits: tuple[list[str], list[int]] | None = None,
+) -> dict[str, dict[str, int]]:
     """
     Count how often files were changed in the same commit
 
@@ -207,22 +350,42 @@ def get_git_dependencies(git_log_path: str, file_map: dict[str, str] | None = No
         - git_log_path: path to a text file with the git log as created by generate_git_log
         - file_map (optional): in case the file names should be mapped to other names (like module names)
             if given, only files listed in this dict are considered as dependencies
+        - max_files_per_commit: commits that change more files than this (e.g., vendored code or formatting
+            sweeps) are skipped, since they say little about actual dependencies and are quadratic to count
+        - commits (optional): the commits as returned by parse_git_log, in case the git log was already parsed
 
     Returns:
         - dict with {file: {dep: count}}: how often a dependency occurred in the same commit as this file;
             it also includes an entry for the file itself so the counts can later be normalized
     """
-    commits = _extract_commits(git_log_path, file_map)
-
-    results: dict[str, dict[str, int]] = {}
-    for files in commits:
-        for f in files:
-            if f not in results:
-                results[f] = defaultdict(int)
-            for f_dep in files:
-                results[f][f_dep] += 1
-
-    return results
+    all_files, offsets = _extract_commits(git_log_path, file_map, commits)
+    # intern the file names as integer ids so the counts are stored per id instead of per name
+    file_ids: dict[str, int] = {}
+    all_ids = [file_ids.setdefault(f, len(file_ids)) for f in all_files]
+    n_files = len(file_ids)
+    # files (or mapped names) are counted at most once per commit; sorted, so pairs are always (lower id, higher id)
+    commit_ids = (sorted(set(all_ids[start:end])) for start, end in pairwise(offsets))
+    commit_ids = (ids for ids in commit_ids if len(ids) <= max_files_per_commit)
+
+    # the ids are mapped back to the file names at the end
+    # (files that only occurred in skipped commits have no counts for themselves and are not included)
+    names = list(file_ids)
+    # one sparse Counter per file, so only the pairs that actually changed together are stored
+    counts: list[Counter[int]] = [Counter() for _ in range(n_files)]
+    # count every pair of files only once (incl. the file itself) and mirror the counts afterwards
+    for ids in commit_ids:
+        for i, file_id in enumerate(ids):
+            # Counter.update counts the elements of a list in C
+            counts[file_id].update(ids[i:])
+    for file_id, file_counts in enumerate(counts):
+        for dep_id, count in file_counts.items():
+            if dep_id > file_id:
+                counts[dep_id][file_id] = count
+    return {
+        names[file_id]: {names[dep_id]: count for dep_id, count in file_counts.items()}
+        for file_id, file_counts in enumerate(counts)
+        if file_counts
+    }
 
 
 def norm_counts(
@@ -243,13 +406,18 @@ def norm_counts(
         - same dict as dep_counts only with normalized count values and excluding the file itself
             as a dependency (useful for plotting)
     """
+    if not dep_counts:
+        return {}
+    # max count per file (computed only once, used for both global and per-file normalization)
+    per_file_max = {f: max(deps.values()) for f, deps in dep_counts.items()}
     # second highest commit count overall (to avoid outliers)
-    max_count_all = sorted([1, 1] + [max(dep_counts[f].values()) for f in dep_counts], reverse=True)[1]
+    max_count_all = heapq.nlargest(2, [1, 1, *per_file_max.values()])[1]
     dep_counts_normed = {}
-    for f in dep_counts:
-        max_count = max_count_all if norm_global else max(dep_counts[f].values())
+    for f, deps in dep_counts.items():
+        max_count = max_count_all if norm_global else per_file_max[f]
         # the file itself was only included in the original dict to get the max value for normalization
+        # (capping the ratio at 1 inline instead of calling min() gives the same values)
         dep_counts_normed[f] = {
-            f_dep: scale * min(1.0, count / max_count) for f_dep, count in dep_counts[f].items() if f_dep != f
+            f_dep: scale * (ratio if (ratio := count / max_count) < 1.0 else 1.0) for f_dep, count in deps.items() if f_dep != f
         }
     return dep_counts_normed
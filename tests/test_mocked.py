@@ -1,3 +1,5 @@
+import json
+
 import depytree.build_depytree as dpt
 from depytree import metrics
 
@@ -9,6 +11,13 @@ def test_get_file_stats():
     assert n_ind == 112
 
 
+def test_get_file_stats_tabs(tmp_path):
+    file_path = tmp_path / "module.py"
+    file_path.write_bytes(b"def f():\n\tif True:\n\t  return 1\n  \n")
+    assert metrics.get_file_stats(str(file_path)) == (4, 3, 12)
+    assert metrics.get_file_stats(str(file_path), space_per_tab=8) == (4, 3, 20)
+
+
 def test_get_git_revisions():
     commit_count, line_change_sum = metrics.get_git_revisions("tests/mock_package/mock_git_log.txt", "mock_module.py")
     assert commit_count == 8
@@ -34,6 +43,10 @@ def test_get_git_dependencies():
     assert git_deps["mock_module.py"] == {"mock_module.py": 8, "utils/__init__.py": 1, "utils/mock_utils.py": 2}
     assert git_deps["utils/__init__.py"] == {"mock_module.py": 1, "utils/__init__.py": 3, "utils/mock_utils.py": 2}
     assert git_deps["utils/mock_utils.py"] == {"mock_module.py": 2, "utils/__init__.py": 2, "utils/mock_utils.py": 5}
+    # the only commit changing all 3 files is skipped
+    git_deps = metrics.get_git_dependencies("tests/mock_package/mock_git_log.txt", max_files_per_commit=2)
+    assert git_deps["mock_module.py"] == {"mock_module.py": 7, "utils/mock_utils.py": 1}
+    assert git_deps["utils/__init__.py"] == {"utils/__init__.py": 2, "utils/mock_utils.py": 1}
 
 
 def test_collect_modules():
@@ -51,6 +64,19 @@ def test_collect_modules():
     assert collected["mock_package.utils.mock_utils"]["type"] == "file"
 
 
+def test_collect_modules_symlink(tmp_path):
+    (tmp_path / "real" / "sub").mkdir(parents=True)
+    (tmp_path / "real" / "sub" / "b.py").write_text("x = 1\n")
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "a.py").write_text("y = 2\n")
+    (tmp_path / "pkg" / "sub").symlink_to(tmp_path / "real" / "sub", target_is_directory=True)
+    # a link cycle shouldn't be followed forever
+    (tmp_path / "real" / "sub" / "loop").symlink_to(tmp_path / "pkg", target_is_directory=True)
+    root_module_name, collected = dpt.collect_modules(str(tmp_path / "pkg"))
+    assert root_module_name == "pkg"
+    assert sorted(collected.keys()) == ["pkg", "pkg.a", "pkg.sub", "pkg.sub.b"]
+
+
 def test_collect_modules_and_units():
     root_module_name, collected_modules, collected_units = dpt.collect_modules_and_units("tests/mock_package")
     assert root_module_name == "mock_package"
@@ -122,3 +148,92 @@ def test_collect_modules_and_units():
     collected_modules = dpt.propagate_directory_deps(collected_modules)
     assert collected_modules["mock_package.utils.mock_utils"]["n_incoming_dependencies_other"] == 1
     assert collected_modules["mock_package.utils"]["n_incoming_dependencies_other"] == 1
+
+
+def test_collect_units_known_submodules():
+    known_submodules = {"mock_package", "mock_package.mock_module", "mock_package.utils", "mock_package.utils.mock_utils"}
+    collected, module_dep_same, module_dep_other = dpt.collect_units(
+        "tests/mock_package/mock_module.py", "mock_package.mock_module", known_submodules
+    )
+    assert module_dep_other == {"mock_package.utils.mock_utils"}
+    # precomputed parents give the same results
+    parent_of = {module_name: dpt.get_parent(module_name) for module_name in known_submodules}
+    assert dpt.collect_units(
+        "tests/mock_package/mock_module.py", "mock_package.mock_module", known_submodules, parent_of=parent_of
+    ) == (collected, module_dep_same, module_dep_other)
+
+
+def test_get_all_git_revisions():
+    git_revisions = metrics.get_all_git_revisions("tests/mock_package/mock_git_log.txt")
+    assert git_revisions == {
+        "mock_module.py": (8, 79),
+        "utils/__init__.py": (3, 115),
+        "utils/mock_utils.py": (5, 446),
+    }
+
+
+def test_parse_git_log():
+    git_revisions, commits = metrics.parse_git_log("tests/mock_package/mock_git_log.txt")
+    assert git_revisions == metrics.get_all_git_revisions("tests/mock_package/mock_git_log.txt")
+    files, offsets = commits
+    assert files[offsets[0] : offsets[1]] == ["mock_module.py"]
+    assert files[offsets[1] : offsets[2]] == ["mock_module.py", "utils/mock_utils.py", "utils/__init__.py"]
+    # the already parsed commits give the same results as parsing the log again
+    git_deps = metrics.get_git_dependencies("tests/mock_package/mock_git_log.txt", commits=commits)
+    assert git_deps == metrics.get_git_dependencies("tests/mock_package/mock_git_log.txt")
+    file_map = {"mock_module.py": "mock_module", "utils/mock_utils.py": "utils.mock_utils"}
+    git_deps = metrics.get_git_dependencies("tests/mock_package/mock_git_log.txt", file_map, commits=commits)
+    assert git_deps["mock_module"] == {"mock_module": 8, "utils.mock_utils": 2}
+    assert git_deps == metrics.get_git_dependencies("tests/mock_package/mock_git_log.txt", file_map)
+
+
+def test_collect_modules_and_units_parallel():
+    assert dpt.collect_modules_and_units("tests/mock_package", max_workers=1) == dpt.collect_modules_and_units(
+        "tests/mock_package", max_workers=2
+    )
+
+
+def test_save_json(tmp_path):
+    root_module_name, collected_modules, collected_units = dpt.collect_modules_and_units("tests/mock_package")
+    collected_modules = dpt.add_metrics_per_file(collected_modules, None, None)
+    collected_modules, collected_units = dpt.add_n_incoming_deps(collected_modules, collected_units)
+    collected_modules = dpt.propagate_directory_deps(collected_modules)
+    sorted_names = dpt.get_sorted_names(root_module_name, collected_modules, collected_units)
+    collected = collected_modules | collected_units
+    for names in (sorted_names, [n for n in sorted_names if collected[n]["type"] == "file"], []):
+        save_path = tmp_path / "graph_data.json"
+        dpt.save_json(names, collected, str(save_path))
+        with open(save_path, encoding="utf-8") as f:
+            assert json.load(f) == dpt.prepare_json(names, collected)
+
+
+def test_get_file_stats_cache(tmp_path, monkeypatch):
+    file_path = tmp_path / "module.py"
+    file_path.write_text("def f():\n    return 1\n")
+    assert metrics.get_file_stats(str(file_path)) == (2, 2, 4)
+    cache_path = str(tmp_path / "file_stats_cache.json")
+    metrics.save_file_stats_cache(cache_path)
+    with open(cache_path) as f:
+        assert json.load(f)[str(file_path)][3:] == [2, 2, 4]
+    # start with an empty cache again and load the saved results
+    monkeypatch.setattr(metrics, "_file_stats_cache", {})
+    monkeypatch.setattr(metrics, "_loaded_file_stats", {})
+    metrics.load_file_stats_cache(cache_path)
+    assert metrics.get_file_stats(str(file_path)) == (2, 2, 4)
+    # changed files are analyzed again
+    file_path.write_text("def f():\n    x = 1\n    return x\n")
+    assert metrics.get_file_stats(str(file_path)) == (3, 3, 8)
+    # files that weren't analyzed in this run are not saved again
+    monkeypatch.setattr(metrics, "_file_stats_cache", {})
+    metrics.save_file_stats_cache(cache_path)
+    with open(cache_path) as f:
+        assert json.load(f) == {}
+    # cache files with the wrong format are ignored, i.e., the stats are computed again
+    st = file_path.stat()
+    for invalid in ([1, 2], {str(file_path): [st.st_mtime_ns, st.st_size, 4, 3]}, {str(file_path): "x"}):
+        with open(cache_path, "w") as f:
+            json.dump(invalid, f)
+        monkeypatch.setattr(metrics, "_file_stats_cache", {})
+        monkeypatch.setattr(metrics, "_loaded_file_stats", {})
+        metrics.load_file_stats_cache(cache_path)
+        assert metrics.get_file_stats(str(file_path)) == (3, 3, 8)
@@ -10,6 +10,18 @@ def test_MinMaxScaler():
     assert scaler.scale(11) == 1
 
 
+def test_MinMaxScaler_outliers():
+    # the smallest and largest values are ignored as outliers, irrespective of the order of the values
+    test_dict = {f"{i}": {"key": v} for i, v in enumerate([3, 100, 1, -50, 2])}
+    scaler = MinMaxScaler(test_dict, "key")
+    assert scaler.scale(2) == 0.5
+    assert scaler.scale(100) == 1
+    assert scaler.scale(-50) == 0
+    # with only one value (or none), 0 is used as the min
+    assert MinMaxScaler({"a": {"key": 5}}, "key").scale(5) == 1
+    assert MinMaxScaler({}, "key").scale(5) == 0
+
+
 def test_norm_counts():
     git_deps = {
         "mock_module.py": {"mock_module.py": 8, "utils/__init__.py": 1, "utils/mock_utils.py": 2},
@@ -27,6 +39,7 @@ def test_norm_counts():
     assert git_deps_normed["mock_module.py"]["utils/mock_utils.py"] == 2 / 5
     assert git_deps_normed["utils/__init__.py"]["mock_module.py"] == 1 / 5
     assert git_deps_normed["utils/mock_utils.py"]["mock_module.py"] == 2 / 5
+    assert norm_counts({}) == {}
 
 
 def test_is_private():